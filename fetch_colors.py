@@ -8,7 +8,7 @@ from google.oauth2.credentials import Credentials
 creds = Credentials.from_authorized_user_file('token.json')
 
 # Build the service
-service = build('calendar', 'v3', credentials=creds)
+service = build('calendar', 'v3', credentials=creds, static_discovery=True)
 
 # Fetch the available colors
 colors = service.colors().get().execute()
@@ -2,38 +2,72 @@
 
 from __future__ import print_function
 import argparse
-import configparser
 import datetime
 import os.path
-import pytz
 import re
 import requests
 import signal
 import sys
+import threading
+import time
 import uuid
+from collections import defaultdict
+from zoneinfo import ZoneInfo
 from google.oauth2.credentials import Credentials
 from google_auth_oauthlib.flow import InstalledAppFlow
 from google.auth.transport.requests import Request
+from google_auth_httplib2 import AuthorizedHttp
 from googleapiclient.discovery import build
+from googleapiclient.http import build_http
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from jira_utils import SUMMARY_TTL, cache_get, cache_key, cache_set, configure_cache, load_jira_config
 
 # Update the SCOPES variable to include event creation permissions
 SCOPES = ['https://www.googleapis.com/auth/calendar']
 
-def load_jira_config(config_file):
-    """Load Jira configuration from a file."""
-    config = configparser.ConfigParser()
-    config.read(config_file)
+# Jira key at the start of a meeting name, e.g. "PROJ-123 Kick-off"
+_JIRA_KEY_RE = re.compile(r'^([A-Z]+-\d+)')
 
-    jira_config = {
-        'BASE_URL': config.get('JIRA', 'BASE_URL').strip('\"'),
-        'API_TOKEN': config.get('JIRA', 'API_TOKEN').strip('\"'),
-        'EMAIL': config.get('JIRA', 'EMAIL').strip('\"')
-    }
+# Working day and lunch break, in minutes since midnight
+DAY_START_MINUTE = 9 * 60
+DAY_END_MINUTE = 17 * 60
+LUNCH_START_MINUTE = 11 * 60
+LUNCH_END_MINUTE = 13 * 60
+
+# Length of a bookable slot
+SLOT_MINUTES = 30
+
+_SLOT = datetime.timedelta(minutes=SLOT_MINUTES)
+_DAY_START = datetime.time(DAY_START_MINUTE // 60, DAY_START_MINUTE % 60)
+_DAY_END = datetime.time(DAY_END_MINUTE // 60, DAY_END_MINUTE % 60)
+
+# Number of days covered by each free/busy query
+FREEBUSY_WINDOW_DAYS = 14
+
+# Number of extra free slots listed each time the user asks for more
+MORE_SLOTS = 20
+
+# Seconds a prefetched list of free slots stays valid
+SLOT_CACHE_TTL = 300
 
-    return jira_config
+# Seconds to wait for a background prefetch before looking the slots up directly
+PREFETCH_TIMEOUT = 30
 
-def authenticate_google(config_file):
-    """Authenticate and return the Google Calendar API service."""
+# Prefetched free slots, keyed by the parameters of the search that produced them
+_slot_cache = {}
+_slot_cache_lock = threading.Lock()
+
+# Shared HTTP session for Jira so connections (and TLS handshakes) are reused between calls
+_session = requests.Session()
+_session.headers.update({"Accept": "application/json"})
+_session.mount("https://", HTTPAdapter(
+    pool_maxsize=16,
+    max_retries=Retry(total=3, backoff_factor=0.3, status_forcelist=[429, 502, 503, 504],
+                      raise_on_status=False)))
+
+def get_google_credentials(config_file):
+    """Authenticate and return the Google API credentials, refreshing token.json as needed."""
     creds = None
     if os.path.exists('token.json'):
         creds = Credentials.from_authorized_user_file('token.json', SCOPES)
@@ -47,128 +81,227 @@ def authenticate_google(config_file):
         with open('token.json', 'w') as token:
             token.write(creds.to_json())
 
-    service = build('calendar', 'v3', credentials=creds)
+    return creds
+
+def build_calendar_service(creds):
+    """Return the Google Calendar API service for the given credentials."""
+    service = build('calendar', 'v3', credentials=creds, static_discovery=True)
     return service
 
+def worker_http(creds):
+    """Return a separate authorized HTTP connection for API calls made off the main thread.
+    httplib2 connections are not thread-safe, so the service's own connection must not be shared."""
+    return AuthorizedHttp(creds, http=build_http())
+
 def get_calendar_timezone(service):
     """Retrieve the time zone setting of the Google Calendar."""
     settings = service.settings().get(setting='timezone').execute()
     return settings['value']
 
-def get_jira_ticket_title(jira_config,jira_key):
-    """Fetch the title of the Jira ticket using Jira API."""
-    url = f"{jira_config['BASE_URL']}/rest/api/3/issue/{jira_key}"
-    auth = (jira_config['EMAIL'], jira_config['API_TOKEN'])
-    headers = {
-        "Accept": "application/json"
+def get_jira_ticket_titles(jira_config, jira_keys):
+    """Fetch the titles of several Jira tickets in a single JQL search.
+
+    Returns a dict mapping each found Jira key to its summary. Summaries are
+    served from the on-disk cache where possible."""
+    titles = {}
+    for jira_key in jira_keys:
+        cached = cache_get(cache_key(jira_config.base_url, 'summary', jira_key), SUMMARY_TTL)
+        if cached is not None:
+            titles[jira_key] = cached
+    jira_keys = [jira_key for jira_key in jira_keys if jira_key not in titles]
+    if not jira_keys:
+        return titles
+
+    url = f"{jira_config.base_url}/rest/api/3/search/jql"
+    auth = (jira_config.email, jira_config.api_token)
+    params = {
+        'jql': "key in (%s)" % ",".join(jira_keys),
+        'fields': 'summary',
+        'maxResults': len(jira_keys)
     }
 
-    response = requests.get(url, auth=auth, headers=headers)
+    try:
+        response = _session.get(url, auth=auth, params=params, timeout=10)
+    except requests.exceptions.RequestException as e:
+        print(f"Failed to fetch Jira issue titles for {', '.join(jira_keys)}: {e}")
+        return titles
 
     if response.status_code == 200:
         data = response.json()
-        return data['fields']['summary']
+        for issue in data.get('issues', []):
+            titles[issue['key']] = issue['fields']['summary']
+            cache_set(cache_key(jira_config.base_url, 'summary', issue['key']), issue['fields']['summary'])
     else:
-        print(f"Failed to fetch Jira issue title for {jira_key}. Status code: {response.status_code}")
-        return None
+        print(f"Failed to fetch Jira issue titles for {', '.join(jira_keys)}. Status code: {response.status_code}")
+
+    return titles
 
-def get_free_slots(service, email_addresses, calendar_timezone, min_slots=40):
+def get_jira_ticket_title(jira_config,jira_key):
+    """Fetch the title of the Jira ticket using Jira API."""
+    return get_jira_ticket_titles(jira_config, [jira_key]).get(jira_key)
+
+def query_free_busy(service, email_addresses, time_min, time_max, http=None):
+    """Run a freebusy query for the given email addresses between time_min and time_max.
+    Uses the service's connection unless http is given; pass worker_http() when calling from another thread."""
+    return service.freebusy().query(
+        body={
+            "timeMin": time_min.isoformat(),
+            "timeMax": time_max.isoformat(),
+            "items": [{"id": email} for email in email_addresses]
+        }
+    ).execute(http=http)
+
+def get_free_slots(service, email_addresses, calendar_timezone, min_slots=40, start_time=None, http=None):
     """Return a list of at least 5 free 30-minute slots on weekdays for the given email addresses.
-    A day is only considered free if the first email address doesn't have more than five hours of meetings that day."""
+    A day is only considered free if the first email address doesn't have more than five hours of meetings that day.
+    The search starts now, or at start_time if that is later. http is passed on to query_free_busy."""
 
-    tz = pytz.timezone(calendar_timezone)
+    tz = ZoneInfo(calendar_timezone)
     local_now = datetime.datetime.now(tz).replace(tzinfo=None)  # Remove timezone info to make it naive
     weekdays = [0, 1, 2, 3, 4]  # Monday to Friday
     first_email = email_addresses[0]
 
-    free_slots = []
-    day_offset = 0
-
-    while len(free_slots) < min_slots:
-        check_date = local_now + datetime.timedelta(days=day_offset)
-        if check_date.weekday() not in weekdays:
-            day_offset += 1
-            continue  # Skip weekends
-
-        # Ensure the check_date is naive before applying the timezone
-        start_of_day = tz.localize(check_date.replace(hour=9, minute=0, second=0, microsecond=0))
-        end_of_day = tz.localize(check_date.replace(hour=17, minute=0, second=0, microsecond=0))
-
-        # Prepare the items list for all email addresses
-        items = [{"id": email} for email in email_addresses]
-
-        events_result = service.freebusy().query(
-            body={
-                "timeMin": start_of_day.isoformat(),
-                "timeMax": end_of_day.isoformat(),
-                "items": items
-            }
-        ).execute()
-
-        # Calculate total meeting time for the first email
-        total_meeting_time = datetime.timedelta()
-        for busy in events_result['calendars'][first_email]['busy']:
-            start = tz.normalize(datetime.datetime.fromisoformat(busy['start'][:-1]).replace(tzinfo=pytz.utc).astimezone(tz))
-            end = tz.normalize(datetime.datetime.fromisoformat(busy['end'][:-1]).replace(tzinfo=pytz.utc).astimezone(tz))
-            total_meeting_time += (end - start)
-
-        # Skip the day if total meeting time exceeds 5 hours
-        if total_meeting_time > datetime.timedelta(hours=5):
-            day_offset += 1
-            continue
-
-        # Combine all busy intervals from all email addresses
-        busy_times = []
-        for email in email_addresses:
-            busy_times.extend(events_result['calendars'][email]['busy'])
+    # Working-hour bounds per date, built once per search
+    day_bounds = {}
 
-        # Convert busy times to datetime objects in the calendar's timezone
-        busy_intervals = [
-            (
-                tz.normalize(datetime.datetime.fromisoformat(busy['start'][:-1]).replace(tzinfo=pytz.utc).astimezone(tz)),
-                tz.normalize(datetime.datetime.fromisoformat(busy['end'][:-1]).replace(tzinfo=pytz.utc).astimezone(tz))
+    def working_hours(date):
+        if date not in day_bounds:
+            day_bounds[date] = (
+                datetime.datetime.combine(date, _DAY_START, tzinfo=tz),
+                datetime.datetime.combine(date, _DAY_END, tzinfo=tz)
             )
-            for busy in busy_times
-        ]
-
-        # Create a list of all 30-minute slots during the day, excluding 11:00-13:00
-        current_time = start_of_day
-        while current_time + datetime.timedelta(minutes=30) <= end_of_day:
-            slot_start = current_time
-            slot_end = slot_start + datetime.timedelta(minutes=30)
-
-            # Skip slots that fall between 11:00 and 13:00
-            if slot_start.hour >= 11 and slot_end.hour < 13:
-                current_time = slot_end
-                continue
+        return day_bounds[date]
 
-            # Skip slots that are in the past
-            if slot_start < tz.normalize(datetime.datetime.now(tz)):
-                current_time = slot_end
-                continue
+    def minute_of_day(dt):
+        return dt.hour * 60 + dt.minute + dt.second / 60
 
-            # Check if the slot is free
-            slot_is_free = all(
-                not (slot_start < busy_end and slot_end > busy_start)
-                for busy_start, busy_end in busy_intervals
-            )
+    # Slots starting before this point are in the past or were already offered
+    earliest = local_now
+    if start_time:
+        earliest = max(earliest, start_time.astimezone(tz).replace(tzinfo=None))
+    earliest_date = earliest.date()
+    earliest_minute = minute_of_day(earliest)
 
-            if slot_is_free:
-                free_slots.append((slot_start, slot_end))
+    free_slots = []
+    window_start = earliest.replace(hour=0, minute=0, second=0, microsecond=0)
+
+    while len(free_slots) < min_slots:
+        # Fetch free/busy information for the whole window in one call
+        window_end = window_start + datetime.timedelta(days=FREEBUSY_WINDOW_DAYS)
+        events_result = query_free_busy(service, email_addresses, window_start.replace(tzinfo=tz), window_end.replace(tzinfo=tz), http)
 
-            current_time += datetime.timedelta(minutes=30)
+        # Bucket busy intervals by date, clipped to working hours as a per-day query would return them
+        busy_by_date = defaultdict(list)
+        for email in email_addresses:
+            for busy in events_result['calendars'][email]['busy']:
+                start = datetime.datetime.fromisoformat(busy['start'].replace('Z', '+00:00')).astimezone(tz)
+                end = datetime.datetime.fromisoformat(busy['end'].replace('Z', '+00:00')).astimezone(tz)
+                date = start.date()
+                while date <= end.date():
+                    start_of_day, end_of_day = working_hours(date)
+                    if start < end_of_day and end > start_of_day:
+                        busy_by_date[date].append((email, max(start, start_of_day), min(end, end_of_day)))
+                    date += datetime.timedelta(days=1)
+
+        check_date = window_start
+        window_start = window_end
+        while check_date < window_end and len(free_slots) < min_slots:
+            date = check_date.date()
+            check_date += datetime.timedelta(days=1)
+            if date.weekday() not in weekdays:
+                continue  # Skip weekends
+
+            start_of_day, _ = working_hours(date)
+
+            # Calculate total meeting time for the first email
+            total_meeting_time = datetime.timedelta()
+            for email, start, end in busy_by_date[date]:
+                if email == first_email:
+                    total_meeting_time += (end - start)
+
+            # Skip the day if total meeting time exceeds 5 hours
+            if total_meeting_time > datetime.timedelta(hours=5):
+                continue
 
-        day_offset += 1  # Move to the next day
+            # Combine all busy intervals from all email addresses, sorted and with overlaps merged.
+            # Work in minutes since midnight so datetimes are only built for free slots
+            busy_intervals = []
+            for start, end in sorted((minute_of_day(start), minute_of_day(end)) for _, start, end in busy_by_date[date]):
+                if busy_intervals and start <= busy_intervals[-1][1]:
+                    busy_intervals[-1] = (busy_intervals[-1][0], max(busy_intervals[-1][1], end))
+                else:
+                    busy_intervals.append((start, end))
+            busy_index = 0
+
+            # Walk all 30-minute slots during the day, excluding 11:00-13:00
+            for slot_minute in range(DAY_START_MINUTE, DAY_END_MINUTE, SLOT_MINUTES):
+                slot_end_minute = slot_minute + SLOT_MINUTES
+
+                # Skip slots that fall between 11:00 and 13:00
+                if slot_minute >= LUNCH_START_MINUTE and slot_end_minute < LUNCH_END_MINUTE:
+                    continue
+
+                # Skip slots that are in the past or were already offered
+                if date == earliest_date and slot_minute < earliest_minute:
+                    continue
+
+                # Check if the slot is free, skipping busy intervals that ended before it
+                while busy_index < len(busy_intervals) and busy_intervals[busy_index][1] <= slot_minute:
+                    busy_index += 1
+                if busy_index >= len(busy_intervals) or slot_end_minute <= busy_intervals[busy_index][0]:
+                    slot_start = start_of_day + datetime.timedelta(minutes=slot_minute - DAY_START_MINUTE)
+                    free_slots.append((slot_start, slot_start + _SLOT))
+                    if len(free_slots) >= min_slots:
+                        break
 
     return free_slots[:min_slots]
 
+def _slot_cache_key(email_addresses, calendar_timezone, start_time, min_slots):
+    return (tuple(email_addresses), calendar_timezone, start_time, min_slots)
+
+def prefetch_free_slots(service, creds, email_addresses, calendar_timezone, start_time, min_slots):
+    """Look up free slots from start_time onwards and store them in the slot cache.
+    Meant to run in a background thread; on failure the slots are looked up again when needed."""
+    try:
+        free_slots = get_free_slots(service, email_addresses, calendar_timezone, min_slots, start_time,
+                                    http=worker_http(creds))
+    except Exception:
+        return
+    key = _slot_cache_key(email_addresses, calendar_timezone, start_time, min_slots)
+    with _slot_cache_lock:
+        _slot_cache[key] = (time.monotonic(), free_slots)
+
+def start_prefetch(service, creds, email_addresses, calendar_timezone, start_time, min_slots):
+    """Run prefetch_free_slots in a daemon thread and return the thread."""
+    prefetch = threading.Thread(
+        target=prefetch_free_slots,
+        args=(service, creds, email_addresses, calendar_timezone, start_time, min_slots),
+        daemon=True)
+    prefetch.start()
+    return prefetch
+
+def get_cached_free_slots(service, email_addresses, calendar_timezone, start_time, min_slots):
+    """Return prefetched free slots from start_time onwards, looking them up now if missing or stale."""
+    key = _slot_cache_key(email_addresses, calendar_timezone, start_time, min_slots)
+    with _slot_cache_lock:
+        entry = _slot_cache.get(key)
+    if entry and time.monotonic() - entry[0] < SLOT_CACHE_TTL:
+        return entry[1]
+    return get_free_slots(service, email_addresses, calendar_timezone, min_slots, start_time)
+
+def print_slots(free_slots, first_number=1):
+    """Print numbered free slots."""
+    for i, (start, end) in enumerate(free_slots, start=first_number):
+        print(f"{i}: {start.strftime('%Y-%m-%d %H:%M')} to {end.strftime('%H:%M')}")
+
 def extract_jira_key(meeting_name):
     """Extract the Jira key if it is at the start of the meeting name."""
-    match = re.match(r'^([A-Z]+-\d+)', meeting_name)
+    match = _JIRA_KEY_RE.match(meeting_name)
     return match.group(1) if match else None
 
-def book_meeting(jira_config, service, email_addresses, slot_start, slot_end, meeting_name, offset_minutes):
-    """Book a meeting in the given time slot with an offset, and update the title with Jira key and issue title."""
+def build_event(jira_titles, email_addresses, slot_start, slot_end, meeting_name, offset_minutes):
+    """Build the event body for a meeting in the given time slot with an offset, updating the title with Jira key and issue title.
+    jira_titles is a dict of Jira key to ticket title, as returned by get_jira_ticket_titles."""
     slot_start = slot_start + datetime.timedelta(minutes=offset_minutes)
     slot_end = slot_end + datetime.timedelta(minutes=offset_minutes)
 
@@ -176,7 +309,7 @@ def book_meeting(jira_config, service, email_addresses, slot_start, slot_end, me
     description = f"Meeting: {meeting_name}"
 
     if jira_key:
-        jira_title = get_jira_ticket_title(jira_config,jira_key)
+        jira_title = jira_titles.get(jira_key)
         if jira_title:
             # Update the meeting name to Jira key followed by the ticket title
             meeting_name = f"{jira_key} {jira_title}"
@@ -184,7 +317,7 @@ def book_meeting(jira_config, service, email_addresses, slot_start, slot_end, me
             description = f"{jira_url}\n\n{description}"
 
     print(slot_start.isoformat())
-    event = {
+    return {
         'summary': meeting_name,
         'description': description,
         'start': {
@@ -210,8 +343,29 @@ def book_meeting(jira_config, service, email_addresses, slot_start, slot_end, me
         'colorId': '5'
     }
 
-    event = service.events().insert(calendarId='primary', body=event, conferenceDataVersion=1).execute()
-    print(f"Meeting booked: {event.get('htmlLink')}")
+def book_meetings(jira_titles, service, email_addresses, slots, meeting_name):
+    """Book a meeting in each of the given (slot_start, slot_end, offset_minutes) slots.
+    Several meetings are sent as a single batch HTTP request."""
+    events = [
+        build_event(jira_titles, email_addresses, slot_start, slot_end, meeting_name, offset_minutes)
+        for slot_start, slot_end, offset_minutes in slots
+    ]
+
+    if len(events) == 1:
+        event = service.events().insert(calendarId='primary', body=events[0], conferenceDataVersion=1).execute()
+        print(f"Meeting booked: {event.get('htmlLink')}")
+        return
+
+    def handle_response(request_id, response, exception):
+        if exception is not None:
+            print(f"Failed to book meeting: {exception}")
+        else:
+            print(f"Meeting booked: {response.get('htmlLink')}")
+
+    batch = service.new_batch_http_request(callback=handle_response)
+    for event in events:
+        batch.add(service.events().insert(calendarId='primary', body=event, conferenceDataVersion=1))
+    batch.execute()
 
 def parse_arguments():
     """Parse CLI arguments."""
@@ -221,6 +375,8 @@ def parse_arguments():
     parser.add_argument('--offset', type=int, default=0, help='Offset in minutes for the meeting time.')
     parser.add_argument('--jira-creds', help='Path to the Jira configuration file.', default='config.ini')
     parser.add_argument('--google-creds', help='Path to the Jira configuration file.', default='/etc/credentials-google')
+    parser.add_argument('--no-cache', action='store_true', help='Do not read or write the Jira cache.')
+    parser.add_argument('--refresh-cache', action='store_true', help='Ignore cached Jira data and fetch it again.')
 
     return parser.parse_args()
 
@@ -234,11 +390,13 @@ if __name__ == '__main__':
     signal.signal(signal.SIGINT, handle_interrupt)
 
     args = parse_arguments()
+    configure_cache(enabled=not args.no_cache, refresh=args.refresh_cache)
 
     # Load Jira configuration
     jira_config = load_jira_config(args.jira_creds)
 
-    service = authenticate_google(args.google_creds)
+    creds = get_google_credentials(args.google_creds)
+    service = build_calendar_service(creds)
 
     # Get the calendar's timezone
     calendar_timezone = get_calendar_timezone(service)
@@ -252,25 +410,50 @@ if __name__ == '__main__':
     else:
         print(args.emails)
         print("Available free slots:")
-        for i, (start, end) in enumerate(free_slots):
-            print(f"{i + 1}: {start.strftime('%Y-%m-%d %H:%M')} to {end.strftime('%H:%M')}")
+        print_slots(free_slots)
 
         try:
-            # Let user choose a slot
-            slot_choice = int(input("Select a slot by number: ")) - 1
-
-            if slot_choice < 0 or slot_choice >= len(free_slots):
-                print("Invalid choice.")
-            else:
-                slot_start, slot_end = free_slots[slot_choice]
-                #import pdb; pdb.set_trace()
-
-                # The meeting name is the Jira key
-                meeting_name = args.title
-
-                # Book the meeting with the selected slot and offset
-                book_meeting(jira_config, service, args.emails, slot_start, slot_end, meeting_name, args.offset)
-        except ValueError:
-            print("Invalid input. Please enter a number.")
+            # Look up the slots after the listed ones while the user is choosing
+            prefetch = start_prefetch(service, creds, args.emails, calendar_timezone, free_slots[-1][1], MORE_SLOTS)
+
+            while True:
+                # Let user choose one or more slots, or ask for more
+                choice = input("Select slots by number (comma-separated for several), 'm' for more slots or 'q' to quit: ").strip().lower()
+
+                if choice == 'q':
+                    sys.exit(0)
+
+                if choice == 'm':
+                    # Carry on from the end of the last listed slot, using the prefetched slots if ready
+                    start_time = free_slots[-1][1]
+                    prefetch.join(timeout=PREFETCH_TIMEOUT)
+                    more_slots = get_cached_free_slots(service, args.emails, calendar_timezone, start_time, MORE_SLOTS)
+                    print_slots(more_slots, len(free_slots) + 1)
+                    free_slots.extend(more_slots)
+
+                    # Look up the next batch while the user reads this one
+                    prefetch = start_prefetch(service, creds, args.emails, calendar_timezone, free_slots[-1][1], MORE_SLOTS)
+                    continue
+
+                numbers = [number.strip() for number in choice.split(',')]
+                if all(number.isdecimal() and 1 <= int(number) <= len(free_slots) for number in numbers):
+                    # Ignore repeated numbers so a slot is only booked once
+                    slot_choices = list(dict.fromkeys(int(number) - 1 for number in numbers))
+                    break
+
+                print(f"Invalid choice. Enter numbers from 1 to {len(free_slots)}, 'm' or 'q'.")
+
+            slots = [(free_slots[i][0], free_slots[i][1], args.offset) for i in slot_choices]
+            #import pdb; pdb.set_trace()
+
+            # The meeting name is the Jira key
+            meeting_name = args.title
+
+            # Look up the Jira ticket title up front, if the title starts with a key
+            jira_key = extract_jira_key(meeting_name)
+            jira_titles = get_jira_ticket_titles(jira_config, [jira_key] if jira_key else [])
+
+            # Book a meeting in each selected slot with the offset
+            book_meetings(jira_titles, service, args.emails, slots, meeting_name)
         except KeyboardInterrupt:
             handle_interrupt(None, None)
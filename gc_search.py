@@ -29,24 +29,35 @@ def authenticate_google_calendar():
         # Save the credentials for the next run
         with open('token.json', 'w') as token:
             token.write(creds.to_json())
-    return build('calendar', 'v3', credentials=creds)
+    return build('calendar', 'v3', credentials=creds, static_discovery=True)
 
 def search_meetings_by_title(calendar_service, partial_title):
     """Search for meetings by partial title and return details including attendees."""
     # Define the time range for searching (e.g., next 7 days)
-    now = datetime.datetime.utcnow().isoformat() + 'Z'  # 'Z' indicates UTC time
-    end_time = (datetime.datetime.utcnow() + datetime.timedelta(days=93)).isoformat() + 'Z'
+    # 'Z' indicates UTC time
+    now = datetime.datetime.now(datetime.timezone.utc)
+    now_iso = now.isoformat().replace('+00:00', 'Z')
+    end_iso = (now + datetime.timedelta(days=93)).isoformat().replace('+00:00', 'Z')
 
-    # Call the Calendar API
-    events_result = calendar_service.events().list(
-        calendarId='primary',
-        timeMin=now,
-        timeMax=end_time,
-        q=partial_title,
-        singleEvents=True,
-        orderBy='startTime'
-    ).execute()
-    events = events_result.get('items', [])
+    # Call the Calendar API, requesting only the fields printed below and following pagination
+    events = []
+    page_token = None
+    while True:
+        events_result = calendar_service.events().list(
+            calendarId='primary',
+            timeMin=now_iso,
+            timeMax=end_iso,
+            q=partial_title,
+            singleEvents=True,
+            orderBy='startTime',
+            maxResults=250,
+            fields='items(start,summary,attendees(email,responseStatus)),nextPageToken',
+            pageToken=page_token
+        ).execute()
+        events.extend(events_result.get('items', []))
+        page_token = events_result.get('nextPageToken')
+        if not page_token:
+            break
 
     if not events:
         print(f'No upcoming meetings found with the title containing "{partial_title}".')
@@ -0,0 +1,154 @@
+"""Helpers shared by gc_booker.py and the scripts in scripts/ for talking to Jira."""
+
+import atexit
+import configparser
+import functools
+import json
+import logging
+import os
+import sqlite3
+import time
+from dataclasses import dataclass, field
+
+# Ticket summaries and reporters rarely change, so they can be served from disk
+DEFAULT_TTL = 240
+SUMMARY_TTL = 3600
+
+CACHE_PATH = os.path.join(
+    os.environ.get('XDG_CACHE_HOME', os.path.expanduser('~/.cache')),
+    'gc_booker', 'jira.sqlite')
+
+@dataclass(frozen=True)
+class JiraConfig:
+    """Jira connection settings read from the [JIRA] section of config.ini."""
+    base_url: str
+    email: str
+    api_token: str = field(repr=False)
+
+@functools.lru_cache(maxsize=None)
+def load_jira_config(config_file):
+    """
+    Load Jira configuration from the specified config file.
+
+    :param config_file: Path to the config.ini file
+    :return: A JiraConfig; repeated calls for the same file return the same object
+    """
+    config = configparser.ConfigParser()
+    config.read(config_file)
+
+    jira_config = JiraConfig(
+        base_url=config.get('JIRA', 'BASE_URL').strip("\""),
+        email=config.get('JIRA', 'EMAIL').strip("\""),
+        api_token=config.get('JIRA', 'API_TOKEN').strip("\"")
+    )
+
+    logging.debug(f"Jira configuration loaded: {jira_config}")
+    return jira_config
+
+def get_jira_connection(jira_config):
+    """
+    Create a Jira client for the instance in jira_config.
+
+    The serverInfo probe is skipped, so no request is made until the client is
+    first used and connection errors surface from that call instead.
+
+    :param jira_config: A JiraConfig, as returned by load_jira_config
+    :return: JIRA connection object
+    """
+    # Imported here so gc_booker.py, which talks to Jira over REST, does not load the jira package
+    from jira import JIRA
+
+    jira = JIRA(basic_auth=(jira_config.email, jira_config.api_token), server=jira_config.base_url,
+                max_retries=3, timeout=10, get_server_info=False)
+    logging.debug(f"Created Jira client for {jira_config.base_url}")
+    return jira
+
+_cache_enabled = True
+_cache_refresh = False
+
+def configure_cache(enabled=True, refresh=False):
+    """Set cache behaviour from CLI flags.
+
+    :param enabled: When False, the cache is neither read nor written (--no-cache)
+    :param refresh: When True, cached entries are ignored but fresh results are stored (--refresh-cache)
+    """
+    global _cache_enabled, _cache_refresh
+    _cache_enabled = enabled
+    _cache_refresh = refresh
+
+_conn = None
+
+def _connection():
+    """Return the cache database connection, opening it on first use.
+
+    The cache is best-effort: if the cache directory or database can't be
+    opened, caching is turned off for the rest of the run and None is returned.
+    """
+    global _conn, _cache_enabled
+    if _conn is None:
+        try:
+            os.makedirs(os.path.dirname(CACHE_PATH), exist_ok=True)
+            conn = sqlite3.connect(CACHE_PATH)
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS cache (key TEXT PRIMARY KEY, payload TEXT, fetched_at INT)')
+        except (OSError, sqlite3.Error) as e:
+            logging.debug(f"Jira cache disabled, can't open {CACHE_PATH}: {e}")
+            _cache_enabled = False
+            return None
+        atexit.register(conn.close)
+        _conn = conn
+    return _conn
+
+def cache_key(base_url, kind, item):
+    """Build a cache key for item, scoped to the Jira instance at base_url."""
+    return f"{base_url.rstrip('/')}|{kind}:{item}"
+
+def cache_get(key, ttl=DEFAULT_TTL):
+    """Return the cached payload for key, or None if missing, expired or caching is off."""
+    if not _cache_enabled or _cache_refresh:
+        return None
+    conn = _connection()
+    if conn is None:
+        return None
+    try:
+        row = conn.execute(
+            'SELECT payload, fetched_at FROM cache WHERE key = ?', (key,)).fetchone()
+    except sqlite3.Error:
+        return None
+    if row is None or time.time() - row[1] >= ttl:
+        return None
+    return json.loads(row[0])
+
+def cache_set(key, payload):
+    """Store payload under key, unless caching is off."""
+    if not _cache_enabled:
+        return
+    conn = _connection()
+    if conn is None:
+        return
+    try:
+        with conn:
+            conn.execute(
+                'INSERT OR REPLACE INTO cache (key, payload, fetched_at) VALUES (?, ?, ?)',
+                (key, json.dumps(payload), int(time.time())))
+    except sqlite3.Error:
+        pass
+
+def disk_cache(make_key, ttl=DEFAULT_TTL):
+    """Cache a function's result on disk under the key returned by make_key(*args, **kwargs).
+
+    None results are treated as failures and are not cached.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            key = make_key(*args, **kwargs)
+            payload = cache_get(key, ttl)
+            if payload is not None:
+                return payload
+            payload = func(*args, **kwargs)
+            if payload is not None:
+                cache_set(key, payload)
+            return payload
+        return wrapper
+    return decorator
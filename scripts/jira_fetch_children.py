@@ -1,27 +1,16 @@
 #!/usr/bin/env python3
 
 import argparse
-import configparser
 import logging
-from jira import JIRA
+import os
+import sys
 from jira.exceptions import JIRAError
 
-def get_jira_connection(jira_url, username, api_token):
-    """
-    Connect to Jira.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from jira_utils import get_jira_connection, load_jira_config
 
-    :param jira_url: The base URL of the Jira instance (e.g., "https://your-domain.atlassian.net")
-    :param username: The Jira username or email address used for authentication
-    :param api_token: The API token for Jira authentication
-    :return: JIRA connection object
-    """
-    try:
-        jira = JIRA(basic_auth=(username, api_token), server=jira_url)
-        logging.debug(f"Connected to Jira at {jira_url}")
-        return jira
-    except JIRAError as e:
-        logging.error(f"Failed to connect to Jira: {str(e)}")
-        return None
+# Number of issues requested per search page
+SEARCH_PAGE_SIZE = 1000
 
 def get_epic_issues(jira, epic_ticket_id, issue_type):
     """
@@ -37,34 +26,26 @@ def get_epic_issues(jira, epic_ticket_id, issue_type):
         jql_query = f'"Epic Link" = {epic_ticket_id} AND issuetype = "{issue_type}"'
         logging.debug(f"JQL Query: {jql_query}")
 
-        issues = jira.search_issues(jql_query)
-        logging.debug(f"Found {len(issues)} issues linked to Epic {epic_ticket_id} of type '{issue_type}'")
-
-        return [issue.key for issue in issues]
+        # Only the key is needed, and results are paged so large Epics are not truncated.
+        # jira==3.5.0 searches through /rest/api/2/search, which pages by startAt. Jira Cloud
+        # has deprecated it in favour of /search/jql (nextPageToken paging); moving needs a
+        # newer jira pin, whose enhanced_search_issues() also needs the serverInfo probe.
+        issue_keys = []
+        start_at = 0
+        while True:
+            issues = jira.search_issues(jql_query, startAt=start_at, maxResults=SEARCH_PAGE_SIZE, fields='key')
+            issue_keys.extend(issue.key for issue in issues)
+            start_at += len(issues)
+            if not issues or start_at >= issues.total:
+                break
+        logging.debug(f"Found {len(issue_keys)} issues linked to Epic {epic_ticket_id} of type '{issue_type}'")
+
+        return issue_keys
 
     except JIRAError as e:
         logging.error(f"Failed to retrieve issues linked to Epic: {str(e)}")
         return []
 
-def load_jira_config(config_file):
-    """
-    Load Jira configuration from the specified config file.
-
-    :param config_file: Path to the config.ini file
-    :return: A dictionary containing Jira configuration
-    """
-    config = configparser.ConfigParser()
-    config.read(config_file)
-
-    jira_config = {
-        'jira_url': config.get('JIRA', 'BASE_URL').strip("\""),
-        'username': config.get('JIRA', 'EMAIL').strip("\""),
-        'api_token': config.get('JIRA', 'API_TOKEN').strip("\"")
-    }
-
-    logging.debug(f"Jira configuration loaded: {jira_config}")
-    return jira_config
-
 def main():
     # Set up argument parser
     parser = argparse.ArgumentParser(description='Get all issues of a specific type linked to a Jira Epic.')
@@ -87,11 +68,8 @@ def main():
     # Load Jira configuration from config file
     jira_config = load_jira_config(args.config)
 
-    # Connect to Jira
-    jira = get_jira_connection(jira_config['jira_url'], jira_config['username'], jira_config['api_token'])
-    if jira is None:
-        print("Failed to connect to Jira.")
-        return
+    # Create the Jira client; requests are only made when it is first used
+    jira = get_jira_connection(jira_config)
 
     # Get issues linked to the Epic of the specified type
     epic_issues = get_epic_issues(jira, args.epic_ticket_id, args.issue_type)
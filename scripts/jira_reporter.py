@@ -1,29 +1,26 @@
 #!/usr/bin/env python3
 
 import argparse
-import configparser
 import logging
+import os
 import sys
-from jira import JIRA
 from jira.exceptions import JIRAError
 
-def get_ticket_reporter_email(ticket_id, jira_url, username, api_token):
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from jira_utils import cache_key, configure_cache, disk_cache, get_jira_connection, load_jira_config
+
+@disk_cache(lambda jira, ticket_id: cache_key(jira.server_url, 'reporter', ticket_id))
+def get_ticket_reporter_email(jira, ticket_id):
     """
     Get the email address of the reporter for a given Jira ticket ID.
 
+    :param jira: JIRA connection object
     :param ticket_id: The Jira ticket ID (e.g., "PROJECT-123")
-    :param jira_url: The base URL of the Jira instance (e.g., "https://your-domain.atlassian.net")
-    :param username: The Jira username or email address used for authentication
-    :param api_token: The API token for Jira authentication
     :return: The email address of the ticket reporter
     """
     try:
-        # Connect to Jira
-        jira = JIRA(basic_auth=(username, api_token), server=jira_url)
-        logging.debug(f"Connected to Jira at {jira_url}")
-
         # Get the issue details
-        issue = jira.issue(ticket_id)
+        issue = jira.issue(ticket_id, fields='reporter')
         logging.debug(f"Issue details retrieved for ticket ID: {ticket_id}")
 
         # Get the reporter's email address
@@ -36,31 +33,14 @@ def get_ticket_reporter_email(ticket_id, jira_url, username, api_token):
         logging.error(f"Failed to retrieve reporter email: {str(e)}")
         return None
 
-def load_jira_config(config_file):
-    """
-    Load Jira configuration from the specified config file.
-
-    :param config_file: Path to the config.ini file
-    :return: A dictionary containing Jira configuration
-    """
-    config = configparser.ConfigParser()
-    config.read(config_file)
-
-    jira_config = {
-        'jira_url': config.get('JIRA', 'BASE_URL').strip("\""),
-        'username': config.get('JIRA', 'EMAIL').strip("\""),
-        'api_token': config.get('JIRA', 'API_TOKEN').strip("\"")
-    }
-
-    logging.debug(f"Jira configuration loaded: {jira_config}")
-    return jira_config
-
 def main():
     # Set up argument parser
     parser = argparse.ArgumentParser(description='Get the email address of the reporter for a Jira ticket.')
     parser.add_argument('ticket_id', type=str, help='The Jira ticket ID (e.g., "PROJECT-123")')
     parser.add_argument('--config', type=str, default='config.ini', help='Path to the config.ini file')
     parser.add_argument('--debug', action='store_true', help='Enable debug output')
+    parser.add_argument('--no-cache', action='store_true', help='Do not read or write the Jira cache')
+    parser.add_argument('--refresh-cache', action='store_true', help='Ignore cached Jira data and fetch it again')
 
     args = parser.parse_args()
 
@@ -73,11 +53,16 @@ def main():
 
     logging.debug(f"Arguments received: ticket_id='{args.ticket_id}', config='{args.config}'")
 
+    configure_cache(enabled=not args.no_cache, refresh=args.refresh_cache)
+
     # Load Jira configuration from config file
     jira_config = load_jira_config(args.config)
 
+    # Create the Jira client; requests are only made when it is first used
+    jira = get_jira_connection(jira_config)
+
     # Get the reporter's email address
-    reporter_email = get_ticket_reporter_email(args.ticket_id, jira_config['jira_url'], jira_config['username'], jira_config['api_token'])
+    reporter_email = get_ticket_reporter_email(jira, args.ticket_id)
 
     if reporter_email:
         print(f"{reporter_email}")